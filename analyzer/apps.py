@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class AnalyzerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analyzer'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite)
+
+        from .strategies import load_strategies
+        load_strategies()
+
+        # map the task snapshot (if any) at startup so the first request is warm
+        from .snapshot import get_snapshot
+        get_snapshot()
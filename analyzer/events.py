@@ -0,0 +1,255 @@
+"""Live ranking events.
+
+The persisted task list has a global ranking (score + position). Whenever it
+changes we publish only the entries that moved -- (title, score, rank) -- to
+subscribers, who receive them over the SSE endpoint. Nothing here sends a
+full list; clients load that once via GET /api/tasks/ (which carries the same
+score and rank) and patch it.
+
+The broker is in-process (one per gunicorn worker): only streams held by the
+process that handled a write hear about it, so the API has to run as a single
+process. It can be swapped for a cross-process implementation with the same
+publish/subscribe/unsubscribe/has_subscribers methods through the
+PRIORITY_EVENTS_BROKER setting.
+"""
+import bisect
+import queue
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .strategies import get_strategy
+from .utils import score_task
+
+
+class InProcessBroker:
+    """Fan-out pub/sub: every subscriber gets its own bounded queue."""
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def has_subscribers(self):
+        with self._lock:
+            return bool(self._subscribers)
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # slow consumer: drop rather than block the writer
+                pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        path = getattr(settings, 'PRIORITY_EVENTS_BROKER', 'analyzer.events.InProcessBroker')
+        _broker = import_string(path)()
+    return _broker
+
+
+def compute_ranking(tasks, strategy='smart'):
+    """Return {title: (score, rank)} for a list of task dicts (rank is 1-based)."""
+    task_map = {t['title']: t for t in tasks}
+    compiled = get_strategy(strategy)
+    scored = []
+    for t in tasks:
+        score, _ = score_task(t, task_map, strategy=compiled)
+        scored.append((score, t['title']))
+    scored.sort(key=lambda x: (-x[0], x[1]))
+    return {title: (score, rank) for rank, (score, title) in enumerate(scored, start=1)}
+
+
+def diff_ranking(old, new):
+    """Entries of `new` whose score or rank differ from `old`."""
+    deltas = []
+    for title, (score, rank) in new.items():
+        if old.get(title) != (score, rank):
+            deltas.append({'task': title, 'score': score, 'rank': rank})
+    deltas.sort(key=lambda d: d['rank'])
+    return deltas
+
+
+class RankingTracker:
+    """Keeps the ranking of persisted tasks and publishes what changes.
+
+    The full Task table is loaded and scored once (when the first stream
+    subscribes, or on the daily rollover). After that a write only re-scores
+    the written titles plus tasks that depend on newly created titles (their
+    dependency_raw changes), and ranks are updated in a sorted list of
+    (-score, title) keys. While nobody is subscribed the cache is dropped and
+    writes cost nothing here.
+    """
+
+    def __init__(self, strategy='smart'):
+        self.strategy = strategy
+        self.ranking = None      # {title: (score, rank)}
+        self.day = None
+        self._keys = []          # sorted [(-score, title)]
+        self._deps = {}          # {title: [dependency titles]}
+        self._dependents = {}    # {dependency title: {titles}}
+        self._lock = threading.Lock()
+
+    def _index(self, title, deps):
+        for d in self._deps.get(title, ()):
+            self._dependents.get(d, set()).discard(title)
+        self._deps[title] = deps
+        for d in deps:
+            self._dependents.setdefault(d, set()).add(title)
+
+    def _score(self, task):
+        # self.ranking holds every known title, which is all score_task needs
+        # from task_map (membership of dependencies)
+        score, _ = score_task(task, self.ranking, strategy=self.strategy)
+        return score
+
+    def _rebuild(self):
+        from .models import Task
+        tasks = [t.to_dict() for t in Task.objects.all()]
+        ranking = compute_ranking(tasks, self.strategy)
+        self._deps, self._dependents = {}, {}
+        for t in tasks:
+            self._index(t['title'], t['dependencies'] or [])
+        self._keys = sorted((-score, title) for title, (score, _) in ranking.items())
+        old, self.ranking = self.ranking, ranking
+        self.day = date.today()
+        return old
+
+    def _rollover(self):
+        # urgency depends on today's date: once the day changes, re-rank
+        # everything before any incremental update (caller holds the lock)
+        if self.ranking is None or self.day == date.today():
+            return []
+        old = self._rebuild()
+        return diff_ranking(old, self.ranking)
+
+    def _publish(self, deltas):
+        if deltas:
+            get_broker().publish({'type': 'ranking', 'deltas': deltas})
+
+    def prime(self):
+        """Load the current ranking (call when subscribing).
+
+        Publishes only if it was cached on an earlier day and had to roll over.
+        """
+        with self._lock:
+            if self.ranking is None:
+                self._rebuild()
+                deltas = []
+            else:
+                deltas = self._rollover()
+        self._publish(deltas)
+
+    def ranks(self, tasks):
+        """{title: (score, rank)} for `tasks`, the persisted tasks as dicts.
+
+        Taken from the cached ranking while streams keep it current, so a
+        listed task and the deltas that follow agree; computed otherwise.
+        """
+        ranking = None
+        with self._lock:
+            if self.ranking is not None:
+                deltas = self._rollover()
+                ranking = {t['title']: self.ranking[t['title']] for t in tasks if t['title'] in self.ranking}
+        if ranking is None:
+            return compute_ranking(tasks, self.strategy)
+        self._publish(deltas)
+        return ranking
+
+    def refresh(self, titles):
+        """Re-rank after `titles` were written; publish and return the deltas."""
+        broker = get_broker()
+        with self._lock:
+            if not broker.has_subscribers():
+                self.ranking = None
+                return []
+            if self.ranking is None:
+                return []
+            if self.day == date.today():
+                deltas = self._update(titles)
+            else:
+                # the rebuild re-reads the whole table, written titles included
+                deltas = self._rollover()
+        self._publish(deltas)
+        return deltas
+
+    def _update(self, titles):
+        from .models import Task
+        titles = set(titles)
+        new_titles = [t for t in titles if t not in self.ranking]
+        for t in new_titles:
+            self.ranking[t] = None
+        affected = set(titles)
+        for t in new_titles:
+            affected |= self._dependents.get(t, set())
+
+        positions = []
+        found = set()
+        size_before = len(self._keys)
+        for task in Task.objects.filter(title__in=affected):
+            task = task.to_dict()
+            title = task['title']
+            found.add(title)
+            self._index(title, task['dependencies'] or [])
+            score = self._score(task)
+            previous = self.ranking.get(title)
+            if previous is not None:
+                if previous[0] == score:
+                    continue
+                i = bisect.bisect_left(self._keys, (-previous[0], title))
+                del self._keys[i]
+                positions.append(i)
+            key = (-score, title)
+            i = bisect.bisect_left(self._keys, key)
+            self._keys.insert(i, key)
+            positions.append(i)
+        # placeholders for new titles get their real entry in the rank loop
+        # below; drop any that weren't found in the table
+        for t in new_titles:
+            if t not in found:
+                del self.ranking[t]
+        if not positions:
+            return []
+
+        # ranks can only move between the first and last touched position;
+        # when the set grew, everything after the insertion point shifts too
+        lo = min(positions)
+        hi = len(self._keys) - 1 if len(self._keys) != size_before else max(positions)
+        deltas = []
+        for rank in range(lo + 1, hi + 2):
+            neg_score, title = self._keys[rank - 1]
+            entry = (-neg_score, rank)
+            if self.ranking.get(title) != entry:
+                self.ranking[title] = entry
+                deltas.append({'task': title, 'score': entry[0], 'rank': rank})
+        return deltas
+
+    def rollover_if_needed(self):
+        """Re-rank everything once the day changed, even without writes."""
+        with self._lock:
+            deltas = self._rollover()
+        self._publish(deltas)
+        return deltas
+
+
+tracker = RankingTracker()
@@ -0,0 +1,249 @@
+"""Asynchronous analysis jobs.
+
+Large /analyze/ requests (hundreds of thousands of tasks) don't fit in a
+request timeout, so POST /api/tasks/jobs/ stores the payload as an
+AnalysisJob row and returns its id. `manage.py run_analysis_worker` runs a
+pool of threads that claim queued jobs from the same SQLite database (no
+external broker), run validation, the cycle check and scoring with progress
+updates, and store the ranked results as AnalysisResult rows for paging.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import date, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import AnalysisJob, AnalysisResult
+from .serializers import TaskSerializer
+from .strategies import get_strategy
+from .utils import build_breakdown, check_tasks, priority_label, score_task
+
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_EVERY = 5000
+RESULT_BATCH = 2000
+VALIDATE_BATCH = 5000
+# a running job with no progress update for this long is assumed orphaned
+STALE_AFTER = timedelta(minutes=10)
+# phases without progress counts (validating, saving) still touch
+# updated_at this often, so live jobs never look stale
+HEARTBEAT_EVERY = timedelta(seconds=30)
+
+
+def payload_hash(tasks, strategy, weights, as_of=None):
+    # urgency and the past-due check depend on today's date, so the same
+    # payload submitted on another day is a different job
+    as_of = as_of or date.today()
+    canonical = json.dumps([tasks, strategy, weights, as_of.isoformat()],
+                           sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def submit_job(tasks, strategy='smart', weights=None):
+    """Queue a job, or return the existing one for an identical payload.
+
+    A failed job is put back on the queue so a resubmit retries it.
+    Returns (job, created).
+    """
+    digest = payload_hash(tasks, strategy, weights)
+    job = AnalysisJob.objects.filter(payload_hash=digest).first()
+    if job is not None:
+        if job.status == AnalysisJob.FAILED:
+            AnalysisJob.objects.filter(id=job.id, status=AnalysisJob.FAILED).update(
+                status=AnalysisJob.QUEUED, phase='', progress=0, error=None, updated_at=timezone.now())
+            job.refresh_from_db()
+        return job, False
+    try:
+        with transaction.atomic():
+            job = AnalysisJob.objects.create(
+                payload_hash=digest, payload=tasks, strategy=strategy, weights=weights,
+                total=len(tasks) if isinstance(tasks, list) else 0,
+            )
+        return job, True
+    except IntegrityError:
+        # lost a race with an identical submission
+        return AnalysisJob.objects.get(payload_hash=digest), False
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running; None if the queue is empty."""
+    while True:
+        job = AnalysisJob.objects.filter(status=AnalysisJob.QUEUED).order_by('id').first()
+        if job is None:
+            return None
+        # conditional update: only one worker (thread or process) wins the job
+        claimed = AnalysisJob.objects.filter(id=job.id, status=AnalysisJob.QUEUED).update(
+            status=AnalysisJob.RUNNING, phase='validating', updated_at=timezone.now())
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs(max_age=STALE_AFTER):
+    """Return running jobs whose worker stopped reporting progress to the queue."""
+    cutoff = timezone.now() - max_age
+    return AnalysisJob.objects.filter(status=AnalysisJob.RUNNING, updated_at__lt=cutoff).update(
+        status=AnalysisJob.QUEUED, phase='', progress=0)
+
+
+def _update(job, **fields):
+    fields['updated_at'] = timezone.now()
+    AnalysisJob.objects.filter(id=job.id).update(**fields)
+    for k, v in fields.items():
+        setattr(job, k, v)
+
+
+def _heartbeat(job):
+    if timezone.now() - job.updated_at >= HEARTBEAT_EVERY:
+        _update(job)
+
+
+def _fail(job, error):
+    _update(job, status=AnalysisJob.FAILED, phase='', error=error)
+
+
+def _row_errors(errors, start=0):
+    """{index: errors} for the failing rows of a list payload.
+
+    DRF reports `{}` for every valid row, which for a large payload would
+    store (and return on every status poll) one entry per task.
+    """
+    return {start + index: row for index, row in enumerate(errors) if row}
+
+
+def _validate(job):
+    """Validate the payload in batches (with heartbeats); returns (tasks, errors)."""
+    payload = job.payload
+    if not isinstance(payload, list):
+        return None, {'error': 'Expected a list of tasks'}
+    tasks, errors = [], {}
+    for start in range(0, len(payload), VALIDATE_BATCH):
+        serializer = TaskSerializer(data=payload[start:start + VALIDATE_BATCH], many=True)
+        if serializer.is_valid():
+            tasks.extend(serializer.validated_data)
+        else:
+            errors.update(_row_errors(serializer.errors, start))
+        _heartbeat(job)
+    return tasks, errors
+
+
+def run_job(job):
+    """Process a claimed job: validate, check cycles, score, store ranked results."""
+    tasks, errors = _validate(job)
+    if errors:
+        return _fail(job, errors)
+
+    _update(job, phase='checking', total=len(tasks))
+    error = check_tasks(tasks)
+    if error:
+        return _fail(job, {'error': error})
+
+    _update(job, phase='scoring')
+    task_map = {t['title']: t for t in tasks}
+    compiled = get_strategy(job.strategy, job.weights)
+    scored = []
+    for index, task in enumerate(tasks, start=1):
+        score, factors = score_task(task, task_map, strategy=compiled)
+        scored.append((score, factors, task))
+        if index % PROGRESS_EVERY == 0:
+            _update(job, progress=index)
+    # stable: equal scores keep input order, as in AnalyzeTasks
+    scored.sort(key=lambda s: s[0], reverse=True)
+
+    _update(job, phase='saving', progress=len(tasks))
+    AnalysisResult.objects.filter(job=job).delete()
+    batch = []
+    for rank, (score, factors, task) in enumerate(scored, start=1):
+        breakdown = build_breakdown(factors)
+        task['score'] = score
+        task['breakdown'] = breakdown
+        task['explanation'] = breakdown.get('explanation', breakdown.get('notes', []))
+        task['priority'] = priority_label(score)
+        batch.append(AnalysisResult(job_id=job.id, rank=rank, data=task))
+        if len(batch) >= RESULT_BATCH:
+            AnalysisResult.objects.bulk_create(batch)
+            batch = []
+            _heartbeat(job)
+    AnalysisResult.objects.bulk_create(batch)
+
+    _update(job, status=AnalysisJob.DONE, phase='')
+
+
+def process_next():
+    """Claim and run one job. Returns the job, or None if the queue was empty."""
+    job = claim_next_job()
+    if job is None:
+        return None
+    try:
+        run_job(job)
+    except Exception as exc:
+        logger.exception('analysis job %s failed', job.id)
+        _fail(job, {'error': str(exc)})
+    return job
+
+
+class WorkerPool:
+    """Threads that poll the job table until stopped.
+
+    While polling, the pool also requeues jobs orphaned by a worker process
+    that died (at most once per `requeue_interval` seconds).
+    """
+
+    max_backoff = 30.0
+    requeue_interval = 60.0
+
+    def __init__(self, workers=2, poll_interval=1.0):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self._requeue_lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def _requeue_stale(self):
+        with self._requeue_lock:
+            now = time.monotonic()
+            if now < self._next_requeue:
+                return
+            self._next_requeue = now + self.requeue_interval
+        requeued = requeue_stale_jobs()
+        if requeued:
+            logger.warning('requeued %d stale analysis job(s)', requeued)
+
+    def _loop(self):
+        backoff = self.poll_interval
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._requeue_stale()
+                    job = process_next()
+                except Exception:
+                    # e.g. "database is locked" past busy_timeout while claiming
+                    # or marking a job failed: keep the thread alive and retry
+                    logger.exception('analysis worker error; retrying in %.1fs', backoff)
+                    connection.close()
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = self.poll_interval
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def start(self):
+        for n in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f'analysis-worker-{n}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+
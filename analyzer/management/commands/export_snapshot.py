@@ -0,0 +1,51 @@
+"""Write the binary task snapshot served by SuggestTasks and ?source=snapshot.
+
+    python manage.py export_snapshot                 # persisted Task rows
+    python manage.py export_snapshot --job 12        # a submitted analysis job
+
+Workers pick up the new file on their next request (it is renamed into
+place, so readers never see a partial write).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from analyzer.models import AnalysisJob, Task
+from analyzer.serializers import TaskSerializer
+from analyzer.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Export an analyzed task set as a memory-mappable snapshot.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', type=int, help='export the payload of this analysis job')
+        parser.add_argument('--strategy', help='defaults to the job strategy, or smart')
+        parser.add_argument('--output', default=getattr(settings, 'TASK_SNAPSHOT_PATH', None))
+
+    def handle(self, *args, **opts):
+        if not opts['output']:
+            raise CommandError('No --output given and TASK_SNAPSHOT_PATH is not set')
+
+        weights = None
+        if opts['job']:
+            job = AnalysisJob.objects.filter(id=opts['job']).first()
+            if job is None:
+                raise CommandError(f"Job {opts['job']} not found")
+            serializer = TaskSerializer(data=job.payload, many=True)
+            if not serializer.is_valid():
+                raise CommandError(f"Job {job.id} payload is invalid")
+            tasks = serializer.validated_data
+            strategy = opts['strategy'] or job.strategy
+            weights = job.weights
+        else:
+            tasks = [{
+                'title': t.title,
+                'due_date': t.due_date,
+                'estimated_hours': t.estimated_hours,
+                'importance': t.importance,
+                'dependencies': t.dependencies or [],
+            } for t in Task.objects.all().order_by('-created_at')]
+            strategy = opts['strategy'] or 'smart'
+
+        n = write_snapshot(opts['output'], tasks, strategy=strategy, weights_override=weights)
+        self.stdout.write(f"wrote {n} tasks to {opts['output']}")
@@ -0,0 +1,123 @@
+"""Concurrent write load test for task upserts.
+
+    python manage.py loadtest_writes --threads 8 --requests 50 --size 5
+
+Runs the same workload twice against the configured database:
+- direct: per-item update_or_create, as TaskListCreate.post used to do
+- coalesced: analyzer.db.task_writes (group commit)
+
+Use --baseline to run with SQLite defaults (rollback journal, synchronous=FULL,
+no busy timeout) to compare against the tuned profile; the SQLITE_PRAGMAS
+connection hook is disabled for it, so the per-thread connections don't
+switch back to WAL. Rows are created with
+a `loadtest-` title prefix and removed afterwards.
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from analyzer.db import TaskWriteQueue
+from analyzer.models import Task
+
+
+PREFIX = 'loadtest-'
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent task upsert throughput (direct vs coalesced).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help='requests per thread')
+        parser.add_argument('--size', type=int, default=5, help='tasks per request')
+        parser.add_argument('--baseline', action='store_true', help='use SQLite default pragmas')
+
+    def handle(self, *args, **opts):
+        if not opts['baseline']:
+            return self._run_all(opts)
+        # reconnect without the pragma profile; journal_mode is stored in the
+        # database file, so switching it here applies to every connection
+        connection.close()
+        with override_settings(SQLITE_PRAGMAS={}):
+            self._pragmas('journal_mode=DELETE')
+            try:
+                self._run_all(opts)
+            finally:
+                self._pragmas('journal_mode=WAL')
+                connection.close()
+
+    def _run_all(self, opts):
+        self.stdout.write(f'journal_mode={self._journal_mode()}')
+        try:
+            for mode in ('direct', 'coalesced'):
+                self._run(mode, opts)
+        finally:
+            Task.objects.filter(title__startswith=PREFIX).delete()
+
+    def _journal_mode(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def _pragmas(self, *pragmas):
+        with connection.cursor() as cursor:
+            for p in pragmas:
+                cursor.execute(f'PRAGMA {p}')
+
+    def _run(self, mode, opts):
+        writes = TaskWriteQueue()
+        errors = []
+        modes = set()
+        lock = threading.Lock()
+
+        def upsert_direct(items):
+            for obj in items:
+                Task.objects.update_or_create(title=obj['title'], defaults={
+                    'importance': obj['importance'],
+                    'estimated_hours': obj['estimated_hours'],
+                    'dependencies': [],
+                })
+
+        def worker(n):
+            if opts['baseline']:
+                # Python's sqlite3 installs a 5 s busy handler by default
+                self._pragmas('synchronous=FULL', 'busy_timeout=0')
+                modes.add(self._journal_mode())
+            try:
+                for r in range(opts['requests']):
+                    items = [{
+                        'title': f'{PREFIX}{n}-{r}-{i}',
+                        'importance': (r + i) % 10 + 1,
+                        'estimated_hours': i + 1,
+                        'dependencies': [],
+                    } for i in range(opts['size'])]
+                    try:
+                        if mode == 'direct':
+                            upsert_direct(items)
+                        else:
+                            writes.submit(items)
+                    except OperationalError as exc:
+                        with lock:
+                            errors.append(str(exc))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(opts['threads'])]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        total = opts['threads'] * opts['requests']
+        self.stdout.write(
+            f'{mode:>9}: {total} requests in {elapsed:.2f}s '
+            f'({total / elapsed:.0f} req/s), {len(errors)} failed'
+            + (f' ({errors[0]})' if errors else '')
+            + (f", thread journal_mode={','.join(sorted(modes))}" if modes else '')
+        )
+        Task.objects.filter(title__startswith=PREFIX).delete()
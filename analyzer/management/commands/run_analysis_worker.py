@@ -0,0 +1,42 @@
+"""Process queued analysis jobs.
+
+    python manage.py run_analysis_worker --workers 2
+
+Jobs are claimed from the AnalysisJob table, so several worker processes
+(or machines sharing the database file) can run side by side. Scoring is
+CPU-bound; for parallelism beyond one core run more processes rather than
+more threads.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from analyzer.jobs import WorkerPool, process_next, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background workers for /api/tasks/jobs/.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help='drain the queue and exit')
+
+    def handle(self, *args, **opts):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'requeued {requeued} stale job(s)')
+
+        if opts['once']:
+            while process_next() is not None:
+                pass
+            return
+
+        pool = WorkerPool(workers=opts['workers'], poll_interval=opts['poll_interval'])
+        pool.start()
+        self.stdout.write(f'{opts["workers"]} analysis worker(s) running')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pool.stop()
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 import json
 
@@ -22,3 +23,51 @@ class Task(models.Model):
 
 	def __str__(self):
 		return self.title
+
+
+class AnalysisJob(models.Model):
+	"""A queued /analyze/ request processed by run_analysis_worker."""
+	QUEUED = 'queued'
+	RUNNING = 'running'
+	DONE = 'done'
+	FAILED = 'failed'
+	STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, DONE, FAILED)]
+
+	# sha256 of the canonical payload; resubmitting the same payload returns this job
+	payload_hash = models.CharField(max_length=64, unique=True)
+	payload = models.JSONField()
+	strategy = models.CharField(max_length=50, default='smart')
+	weights = models.JSONField(null=True, blank=True)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+	phase = models.CharField(max_length=20, blank=True, default='')
+	progress = models.IntegerField(default=0)
+	total = models.IntegerField(default=0)
+	error = models.JSONField(null=True, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def to_dict(self):
+		return {
+			'id': self.id,
+			'status': self.status,
+			'phase': self.phase,
+			'progress': self.progress,
+			'total': self.total,
+			'strategy': self.strategy,
+			'error': self.error,
+			'created_at': self.created_at.isoformat() if self.created_at else None,
+			'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+		}
+
+	def __str__(self):
+		return f'job {self.id} ({self.status})'
+
+
+class AnalysisResult(models.Model):
+	"""One scored task of a finished job, stored in rank order for paging."""
+	job = models.ForeignKey(AnalysisJob, on_delete=models.CASCADE, related_name='results')
+	rank = models.IntegerField()
+	data = models.JSONField(encoder=DjangoJSONEncoder)
+
+	class Meta:
+		constraints = [models.UniqueConstraint(fields=['job', 'rank'], name='unique_job_rank')]
@@ -0,0 +1,136 @@
+"""Server-side filtering and paging for analyze/suggest results.
+
+Query parameters (all optional):
+- priority=High,Medium       only these priority labels
+- min_score / max_score      inclusive score range
+- due_after / due_before     inclusive due-date window (YYYY-MM-DD); tasks
+                             without a due date are excluded when set
+- no_deps=1                  only tasks with no dependencies
+- offset / limit             page of the score-sorted result
+
+Cheap filters (due date, dependencies) run before scoring, score filters run
+right after it, and breakdowns are only built for the returned page. With a
+limit we take the top offset+limit via a heap instead of sorting everything.
+"""
+import heapq
+from datetime import date
+
+from .utils import priority_label
+
+
+PRIORITY_LABELS = ('High', 'Medium', 'Low')
+TRUTHY = ('1', 'true', 'yes')
+
+
+class TaskQuery:
+    def __init__(self, priorities=None, min_score=None, max_score=None,
+                 due_after=None, due_before=None, no_deps=False, offset=0, limit=None):
+        self.priorities = priorities
+        self.min_score = min_score
+        self.max_score = max_score
+        self.due_after = due_after
+        self.due_before = due_before
+        self.no_deps = no_deps
+        self.offset = offset
+        self.limit = limit
+
+    @classmethod
+    def from_params(cls, params, default_limit=None):
+        """Build a query from request query params; raises ValueError on bad input."""
+        def number(name, cast=float, minimum=None):
+            raw = params.get(name)
+            if raw in (None, ''):
+                return None
+            try:
+                value = cast(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{name}' must be a number")
+            if minimum is not None and value < minimum:
+                raise ValueError(f"'{name}' must be >= {minimum}")
+            return value
+
+        def day(name):
+            raw = params.get(name)
+            if not raw:
+                return None
+            try:
+                return date.fromisoformat(raw)
+            except ValueError:
+                raise ValueError(f"'{name}' must be a date (YYYY-MM-DD)")
+
+        priorities = None
+        if params.get('priority'):
+            priorities = {p.strip().capitalize() for p in params['priority'].split(',') if p.strip()}
+            unknown = priorities - set(PRIORITY_LABELS)
+            if unknown:
+                raise ValueError(f"Unknown priority: {', '.join(sorted(unknown))}")
+
+        limit = number('limit', int, 0)
+        return cls(
+            priorities=priorities,
+            min_score=number('min_score'),
+            max_score=number('max_score'),
+            due_after=day('due_after'),
+            due_before=day('due_before'),
+            no_deps=str(params.get('no_deps', '')).lower() in TRUTHY,
+            offset=number('offset', int, 0) or 0,
+            limit=default_limit if limit is None else limit,
+        )
+
+    def has_filters(self):
+        return bool(self.priorities or self.no_deps or self.due_after or self.due_before
+                    or self.min_score is not None or self.max_score is not None)
+
+    def prefilter(self, task):
+        """Filters that don't need a score."""
+        due = task.get('due_date')
+        if isinstance(due, str):
+            try:
+                due = date.fromisoformat(due)
+            except ValueError:
+                due = None
+        return self.match_fields(bool(task.get('dependencies')), due)
+
+    def match_fields(self, has_deps, due):
+        """prefilter() on already-extracted fields (used by snapshots)."""
+        if self.no_deps and has_deps:
+            return False
+        if self.due_after or self.due_before:
+            if due is None:
+                return False
+            if self.due_after and due < self.due_after:
+                return False
+            if self.due_before and due > self.due_before:
+                return False
+        return True
+
+    def score_filter(self, score):
+        if self.min_score is not None and score < self.min_score:
+            return False
+        if self.max_score is not None and score > self.max_score:
+            return False
+        if self.priorities is not None and priority_label(score) not in self.priorities:
+            return False
+        return True
+
+    def select(self, tasks, score_fn):
+        """Score, filter and page `tasks`.
+
+        score_fn(task) -> (score, factors). Returns (total_matches, page) where
+        page is a list of (score, factors, task), highest score first; ties keep
+        input order, as with a stable sort.
+        """
+        matches = []
+        for index, task in enumerate(tasks):
+            if not self.prefilter(task):
+                continue
+            score, factors = score_fn(task)
+            if self.score_filter(score):
+                matches.append((-score, index, factors, task))
+
+        if self.limit is None:
+            ordered = sorted(matches, key=lambda m: (m[0], m[1]))[self.offset:]
+        else:
+            end = self.offset + self.limit
+            ordered = heapq.nsmallest(end, matches, key=lambda m: (m[0], m[1]))[self.offset:]
+        return len(matches), [(-neg, factors, task) for neg, _, factors, task in ordered]
@@ -0,0 +1,338 @@
+"""Memory-mapped binary snapshots of an analyzed task set.
+
+A snapshot stores a scored task set in rank order as fixed-width columns so a
+worker can mmap it read-only and serve suggestions and ranked list queries
+without parsing JSON or re-scoring. All workers mapping the same file share
+the page cache; column access goes through memoryview casts (no copies).
+
+Layout (native little-endian, every section aligned to 8 bytes):
+
+    header    magic, version, flags (cycles), n tasks, n strings,
+              n dependency edges, as-of date, strategy name, weights and
+              urgency curve
+    score     int32[n]      score under the header's strategy on as-of date
+    urgency   float64[n]    urgency_raw under the header's curve on as-of date
+    imp_raw   float64[n]    importance_raw
+    eff_raw   float64[n]    effort_raw
+    dep_raw   float64[n]    dependency_raw
+    due       int32[n]      date.toordinal(), 0 = no due date
+    hours     float64[n]    estimated_hours, NaN = unset
+    imp       int32[n]      importance, 0 = unset
+    indptr    uint32[n+1]   CSR: dependencies of row i are
+    indices   uint32[nnz]        indices[indptr[i]:indptr[i+1]]
+    stroff    uint32[s+1]   string table offsets; strings 0..n-1 are the
+    strings   utf-8 bytes   titles, the rest are unknown dependency names
+
+Rows are in rank order, so with the same strategy on the as-of date the top
+of the file is the answer. Another strategy or day re-runs the compiled
+scoring function over the factor columns once; the resulting order is cached
+per process for the rest of the day, so only the first such request pays for
+the full pass. Re-export daily to keep the default strategy on the fast path.
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from datetime import date
+
+from .strategies import get_strategy
+from .utils import build_breakdown, detect_circular, priority_label, score_task, urgency_note
+
+
+MAGIC = b'STAS'
+VERSION = 1
+FLAG_CYCLES = 1
+
+logger = logging.getLogger(__name__)
+# magic, version, flags, n, n_strings, nnz, as_of, strategy, u, i, e, d, curve
+HEADER = struct.Struct('<4sHHIIIi16s4d16s')
+HEADER_SIZE = (HEADER.size + 7) // 8 * 8
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _align(n):
+    return (n + 7) // 8 * 8
+
+
+def _layout(n, n_strings, nnz):
+    """Byte offsets of each section, shared by writer and reader."""
+    sections = [
+        ('score', 'i', n), ('urgency', 'd', n), ('imp_raw', 'd', n), ('eff_raw', 'd', n),
+        ('dep_raw', 'd', n), ('due', 'i', n), ('hours', 'd', n), ('imp', 'i', n),
+        ('indptr', 'I', n + 1), ('indices', 'I', nnz), ('stroff', 'I', n_strings + 1),
+    ]
+    offsets = {}
+    pos = HEADER_SIZE
+    for name, code, count in sections:
+        offsets[name] = (pos, code, count)
+        pos = _align(pos + count * array(code).itemsize)
+    offsets['strings'] = (pos, 'B', None)
+    return offsets
+
+
+def _name(value):
+    encoded = value.encode()
+    if len(encoded) > 16:
+        raise SnapshotError(f"'{value}' is longer than 16 bytes; use a shorter strategy or curve name")
+    return encoded.ljust(16, b'\0')
+
+
+def write_snapshot(path, tasks, strategy='smart', weights_override=None):
+    """Score `tasks` (validated task dicts) and write a snapshot to `path`.
+
+    The file is written next to `path` and renamed into place, so workers
+    never map a half-written snapshot.
+    """
+    if sys.byteorder != 'little':
+        raise SnapshotError('snapshots are little-endian only')
+    compiled = get_strategy(strategy, weights_override)
+    task_map = {t['title']: t for t in tasks}
+    scored = []
+    for index, task in enumerate(tasks):
+        score, factors = score_task(task, task_map, strategy=compiled)
+        scored.append((score, index, factors, task))
+    # same order as AnalyzeTasks: score desc, ties in input order
+    scored.sort(key=lambda s: (-s[0], s[1]))
+
+    titles = [task['title'] for _, _, _, task in scored]
+    string_ids = {title: i for i, title in enumerate(titles)}
+    strings = list(titles)
+    cols = {name: array(code) for name, code in (
+        ('score', 'i'), ('urgency', 'd'), ('imp_raw', 'd'), ('eff_raw', 'd'), ('dep_raw', 'd'),
+        ('due', 'i'), ('hours', 'd'), ('imp', 'i'), ('indptr', 'I'), ('indices', 'I'))}
+    cols['indptr'].append(0)
+    for score, _, factors, task in scored:
+        urgency_raw, importance_raw, effort_raw, dependency_raw = factors[:4]
+        due = task.get('due_date')
+        hours = task.get('estimated_hours')
+        cols['score'].append(score)
+        cols['urgency'].append(urgency_raw)
+        cols['imp_raw'].append(importance_raw)
+        cols['eff_raw'].append(effort_raw)
+        cols['dep_raw'].append(dependency_raw)
+        cols['due'].append(due.toordinal() if isinstance(due, date) else 0)
+        cols['hours'].append(math.nan if hours is None else float(hours))
+        cols['imp'].append(task.get('importance') or 0)
+        for dep in task.get('dependencies') or []:
+            if dep not in string_ids:
+                string_ids[dep] = len(strings)
+                strings.append(dep)
+            cols['indices'].append(string_ids[dep])
+        cols['indptr'].append(len(cols['indices']))
+
+    encoded = [s.encode() for s in strings]
+    cols['stroff'] = array('I', [0])
+    for b in encoded:
+        cols['stroff'].append(cols['stroff'][-1] + len(b))
+
+    n, nnz = len(titles), len(cols['indices'])
+    layout = _layout(n, len(strings), nnz)
+    w = compiled.weights
+    flags = FLAG_CYCLES if detect_circular(task_map) else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, n, len(strings), nnz, date.today().toordinal(),
+                         _name(compiled.name), w['u'], w['i'], w['e'], w['d'], _name(compiled.curve))
+
+    tmp = f'{path}.tmp{os.getpid()}'
+    with open(tmp, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for name, (offset, _, _) in layout.items():
+            f.write(b'\0' * (offset - f.tell()))
+            if name == 'strings':
+                f.write(b''.join(encoded))
+            else:
+                f.write(cols[name].tobytes())
+    os.replace(tmp, path)
+    return n
+
+
+class Snapshot:
+    """Read-only view over a mapped snapshot file."""
+
+    # re-ranked orders kept per day (one per strategy/weights asked for)
+    ranked_cache_size = 8
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise SnapshotError('snapshots are little-endian only')
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size < HEADER_SIZE:
+                    raise SnapshotError(f'{path}: truncated snapshot')
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise SnapshotError(f'{path}: cannot map snapshot: {exc}') from exc
+        self.path = str(path)
+        self.stat_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        self._ranked_cache = {}
+        self._ranked_lock = threading.Lock()
+
+        (magic, version, flags, n, n_strings, nnz, as_of, strategy,
+         wu, wi, we, wd, curve) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f'{path}: not a version {VERSION} task snapshot')
+        self.n = n
+        self.cycles = bool(flags & FLAG_CYCLES)
+        try:
+            self.as_of = date.fromordinal(as_of)
+            self.strategy = strategy.rstrip(b'\0').decode()
+            self.curve = curve.rstrip(b'\0').decode()
+        except (UnicodeDecodeError, ValueError) as exc:
+            raise SnapshotError(f'{path}: corrupt snapshot header') from exc
+        self.weights = {'u': wu, 'i': wi, 'e': we, 'd': wd}
+
+        layout = _layout(n, n_strings, nnz)
+        self.strings_offset = layout.pop('strings')[0]
+        if self.strings_offset > len(self._mm):
+            raise SnapshotError(f'{path}: truncated snapshot')
+        view = memoryview(self._mm)
+        for name, (offset, code, count) in layout.items():
+            setattr(self, name, view[offset:offset + count * array(code).itemsize].cast(code))
+        if self.strings_offset + self.stroff[-1] > len(self._mm):
+            raise SnapshotError(f'{path}: truncated snapshot')
+
+    def __len__(self):
+        return self.n
+
+    def string(self, i):
+        start = self.strings_offset
+        return self._mm[start + self.stroff[i]:start + self.stroff[i + 1]].decode()
+
+    def title(self, i):
+        return self.string(i)
+
+    def dependencies(self, i):
+        return [self.string(j) for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def due_date(self, i):
+        return date.fromordinal(self.due[i]) if self.due[i] else None
+
+    def task(self, i):
+        """Row i as a task dict, like TaskListCreate.get."""
+        due = self.due_date(i)
+        hours = self.hours[i]
+        return {
+            'title': self.title(i),
+            'due_date': due.isoformat() if due else None,
+            'estimated_hours': None if math.isnan(hours) else hours,
+            'importance': self.imp[i] or None,
+            'dependencies': self.dependencies(i),
+        }
+
+    def _precomputed(self, compiled, today):
+        return (compiled.curve == self.curve and compiled.weights == self.weights
+                and self.as_of.toordinal() == today)
+
+    def _urgency(self, i, compiled, today):
+        if not self.due[i]:
+            return 0
+        if compiled.curve == self.curve and today == self.as_of.toordinal():
+            return self.urgency[i]
+        return compiled.urgency(self.due[i] - today)
+
+    def _ranked(self, compiled, today):
+        """(scores, order) under `compiled` today; order lists rows by rank.
+
+        The file's own columns when it was written with this strategy today,
+        otherwise scored once per strategy and day and cached.
+        """
+        if self._precomputed(compiled, today):
+            return self.score, range(self.n)
+        key = (today, compiled.curve, tuple(sorted(compiled.weights.items())))
+        with self._ranked_lock:
+            cached = self._ranked_cache.get(key)
+        if cached is not None:
+            return cached
+        imp_raw, eff_raw, dep_raw = self.imp_raw, self.eff_raw, self.dep_raw
+        scores = array('i', (
+            compiled.score(self._urgency(i, compiled, today), imp_raw[i], eff_raw[i], dep_raw[i])
+            for i in range(self.n)))
+        # ties keep file order, as with a stable sort
+        cached = (scores, array('I', sorted(range(self.n), key=lambda i: -scores[i])))
+        with self._ranked_lock:
+            # orders from earlier days are never asked for again
+            self._ranked_cache = {k: v for k, v in self._ranked_cache.items() if k[0] == today}
+            if len(self._ranked_cache) >= self.ranked_cache_size:
+                del self._ranked_cache[next(iter(self._ranked_cache))]
+            self._ranked_cache[key] = cached
+        return cached
+
+    def select(self, query, strategy='smart', weights_override=None):
+        """TaskQuery.select over the snapshot.
+
+        Returns (total_matches, rows) with rows shaped like SuggestTasks
+        entries plus the task fields. Scores come straight from the file when
+        the strategy matches the one it was written with (same day);
+        otherwise from the day's cached re-ranking (see _ranked).
+        """
+        compiled = get_strategy(strategy, weights_override)
+        today = date.today().toordinal()
+        dated = query.due_after or query.due_before
+        scores, order = self._ranked(compiled, today)
+        end = None if query.limit is None else query.offset + query.limit
+
+        if not query.has_filters():
+            # order is the answer; touch only the page
+            return self.n, [self._row(i, scores[i], compiled, today) for i in order[query.offset:end]]
+
+        matches = []
+        for i in order:
+            if query.no_deps or dated:
+                due = date.fromordinal(self.due[i]) if dated and self.due[i] else None
+                if not query.match_fields(self.indptr[i + 1] > self.indptr[i], due):
+                    continue
+            if query.score_filter(scores[i]):
+                matches.append(i)
+        return len(matches), [self._row(i, scores[i], compiled, today) for i in matches[query.offset:end]]
+
+    def _row(self, i, score, compiled, today):
+        notes = []
+        if self.due[i]:
+            notes.append(urgency_note(self.due[i] - today))
+        factors = (self._urgency(i, compiled, today), self.imp_raw[i], self.eff_raw[i],
+                   self.dep_raw[i], compiled.weights, notes)
+        breakdown = build_breakdown(factors)
+        row = self.task(i)
+        row.update({
+            'score': score,
+            'priority': priority_label(score),
+            'explanation': breakdown.get('notes', []),
+            'breakdown': breakdown,
+        })
+        return row
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """The configured snapshot (settings.TASK_SNAPSHOT_PATH), or None.
+
+    Mapped once per process and re-mapped when the file is replaced.
+    """
+    global _snapshot
+    from django.conf import settings
+    path = getattr(settings, 'TASK_SNAPSHOT_PATH', None)
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != str(path) or _snapshot.stat_key != key:
+            try:
+                _snapshot = Snapshot(path)
+            except SnapshotError:
+                logger.exception('ignoring unreadable task snapshot %s', path)
+                _snapshot = None
+        return _snapshot
@@ -0,0 +1,136 @@
+"""Scoring strategy registry.
+
+A strategy is a set of weights (u=urgency, i=importance, e=effort,
+d=dependencies) plus an urgency curve that turns days_left into urgency_raw.
+Each strategy is compiled once into a scoring function with its weights
+bound as constants, so calculate_priority does a dict lookup per call
+instead of rebuilding the weight table.
+
+The built-in strategies are registered at import; settings.SCORING_STRATEGIES
+can add or replace strategies and is applied once at startup (AppConfig.ready).
+Per-request weight overrides are compiled on first use and cached; code
+scoring many tasks looks the strategy up once and passes the compiled
+Strategy to score_task.
+"""
+from functools import lru_cache
+from types import MappingProxyType
+
+
+URGENCY_CURVES = {}
+STRATEGIES = {}
+
+DEFAULT_STRATEGY = 'smart'
+
+DEFAULT_STRATEGIES = {
+    'smart':    {'weights': {'u': 2, 'i': 3, 'e': 2, 'd': 2}},
+    'fastest':  {'weights': {'u': 1, 'i': 1, 'e': 3, 'd': 1}},
+    'impact':   {'weights': {'u': 1, 'i': 4, 'e': 1, 'd': 2}},
+    'deadline': {'weights': {'u': 4, 'i': 1, 'e': 1, 'd': 2}},
+}
+
+
+def register_urgency_curve(name):
+    """Decorator: register fn(days_left) -> urgency_raw under `name`."""
+    def decorator(fn):
+        URGENCY_CURVES[name] = fn
+        return fn
+    return decorator
+
+
+@register_urgency_curve('linear')
+def linear_urgency(days_left):
+    # past-due and due-today get fixed boosts; otherwise one point per day
+    # closer than 20 days out
+    if days_left < 0:
+        return 30
+    if days_left == 0:
+        return 25
+    return max(0, 20 - days_left)
+
+
+@register_urgency_curve('exponential')
+def exponential_urgency(days_left, half_life=5):
+    # like linear, but urgency halves every `half_life` days instead of
+    # dropping to zero after 20
+    if days_left < 0:
+        return 30
+    if days_left == 0:
+        return 25
+    return round(20 * 0.5 ** (days_left / half_life), 2)
+
+
+class Strategy:
+    """A compiled strategy: `score(u_raw, i_raw, e_raw, d_raw) -> int`."""
+    __slots__ = ('name', 'weights', 'curve', 'urgency', 'score')
+
+    def __init__(self, name, weights, curve, score):
+        self.name = name
+        # read-only: the scoring closure has these values baked in
+        self.weights = MappingProxyType(weights)
+        self.curve = curve
+        self.urgency = URGENCY_CURVES[curve]
+        self.score = score
+
+
+def compile_strategy(name, weights, urgency='linear'):
+    if urgency not in URGENCY_CURVES:
+        raise ValueError(f"Unknown urgency curve '{urgency}'")
+    missing = {'u', 'i', 'e', 'd'} - set(weights)
+    if missing:
+        raise ValueError(f"Strategy '{name}' is missing weights: {sorted(missing)}")
+    wu, wi, we, wd = weights['u'], weights['i'], weights['e'], weights['d']
+
+    def score(urgency_raw, importance_raw, effort_raw, dependency_raw):
+        s = int(urgency_raw * wu + importance_raw * wi + effort_raw * we + dependency_raw * wd)
+        # clamp score to reasonable range
+        return 0 if s < 0 else 100 if s > 100 else s
+
+    return Strategy(name, dict(weights), urgency, score)
+
+
+def register_strategy(name, weights, urgency='linear'):
+    STRATEGIES[name] = compile_strategy(name, weights, urgency)
+    _with_override.cache_clear()
+    return STRATEGIES[name]
+
+
+def get_strategy(name, weights_override=None):
+    """Look up a compiled strategy (unknown names fall back to 'smart')."""
+    base = STRATEGIES.get(name) or STRATEGIES[DEFAULT_STRATEGY]
+    if not isinstance(weights_override, dict):
+        return base
+    # partial overrides allowed; ignore unknown keys and non-numeric values
+    override = tuple(sorted(
+        (k, v) for k, v in weights_override.items()
+        if k in base.weights and isinstance(v, (int, float))
+    ))
+    if not override:
+        return base
+    return _with_override(base.name, override)
+
+
+@lru_cache(maxsize=256)
+def _with_override(name, override):
+    base = STRATEGIES[name]
+    return compile_strategy(name, {**base.weights, **dict(override)}, base.curve)
+
+
+def load_strategies(config=None):
+    """Register strategies from settings.SCORING_STRATEGIES (called at startup).
+
+    Format: {'name': {'weights': {'u': .., 'i': .., 'e': .., 'd': ..},
+                      'urgency': 'linear' | 'exponential' | <registered curve>}}
+    Weights may be partial for names that already exist.
+    """
+    if config is None:
+        from django.conf import settings
+        config = getattr(settings, 'SCORING_STRATEGIES', {})
+    for name, spec in (config or {}).items():
+        existing = STRATEGIES.get(name)
+        weights = {**(existing.weights if existing else {}), **spec.get('weights', {})}
+        curve = spec.get('urgency', existing.curve if existing else 'linear')
+        register_strategy(name, weights, curve)
+
+
+for _name, _spec in DEFAULT_STRATEGIES.items():
+    register_strategy(_name, _spec['weights'], _spec.get('urgency', 'linear'))
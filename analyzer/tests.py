@@ -1,8 +1,23 @@
+import os
+import tempfile
+import threading
+import time
 from datetime import date, timedelta
-from django.test import SimpleTestCase
+from unittest import mock
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
-from analyzer.utils import calculate_priority, detect_circular
+from analyzer.utils import calculate_priority, detect_circular, score_task
+from analyzer.events import InProcessBroker, compute_ranking, diff_ranking, get_broker, tracker
+from analyzer.db import TaskWriteQueue
+from analyzer.views import PriorityStream
+from analyzer.models import AnalysisJob, Task
+from analyzer.jobs import WorkerPool, payload_hash, process_next
+from analyzer.query import TaskQuery
+from analyzer.snapshot import Snapshot, SnapshotError, get_snapshot, write_snapshot
+from analyzer.strategies import STRATEGIES, get_strategy, load_strategies
 
 
 class UtilsTests(SimpleTestCase):
@@ -35,6 +50,34 @@ class UtilsTests(SimpleTestCase):
 		self.assertNotEqual(s_fastest, s_impact)
 		self.assertTrue(all(isinstance(s, int) for s in (s_smart, s_fastest, s_impact)))
 
+	def test_registered_strategy_with_exponential_curve(self):
+		load_strategies({'decay_test': {'weights': {'u': 1, 'i': 0, 'e': 0, 'd': 0}, 'urgency': 'exponential'}})
+		self.addCleanup(STRATEGIES.pop, 'decay_test')
+		task = {'title': 'T3', 'due_date': date.today() + timedelta(days=25), 'dependencies': []}
+		s_linear, _ = calculate_priority(dict(task), {}, strategy='deadline')
+		score, breakdown = calculate_priority(dict(task), {}, strategy='decay_test')
+		# linear urgency is 0 past 20 days; the exponential curve is not
+		self.assertEqual(breakdown['urgency_raw'], 0.62)
+		self.assertEqual(score, 0)
+		self.assertGreater(s_linear, 0)
+
+	def test_weights_override_compiled_once(self):
+		a = get_strategy('smart', {'u': 5, 'bogus': 1})
+		b = get_strategy('smart', {'u': 5})
+		self.assertIs(a, b)
+		self.assertEqual(a.weights, {'u': 5, 'i': 3, 'e': 2, 'd': 2})
+		self.assertIs(get_strategy('nope'), get_strategy('smart'))
+
+	def test_breakdown_weights_are_a_copy(self):
+		_, breakdown = calculate_priority({'title': 'T4', 'dependencies': []}, {}, strategy='smart')
+		breakdown['weights']['u'] = 99
+		self.assertEqual(get_strategy('smart').weights['u'], 2)
+		with self.assertRaises(TypeError):
+			get_strategy('smart').weights['u'] = 99
+		# scoring alone shares the registry's weights; only breakdowns copy
+		_, factors = score_task({'title': 'T4'}, {}, strategy=get_strategy('smart'))
+		self.assertIs(factors[4], get_strategy('smart').weights)
+
 	def test_detect_circular_true(self):
 		tasks = {
 			'A': {'dependencies': ['B']},
@@ -42,6 +85,12 @@ class UtilsTests(SimpleTestCase):
 		}
 		self.assertTrue(detect_circular(tasks))
 
+	def test_detect_circular_long_chain(self):
+		tasks = {f'T{i}': {'dependencies': [f'T{i + 1}']} for i in range(5000)}
+		self.assertFalse(detect_circular(tasks))
+		tasks['T4999']['dependencies'] = ['T0']
+		self.assertTrue(detect_circular(tasks))
+
 	def test_detect_circular_false(self):
 		tasks = {
 			'A': {'dependencies': ['B']},
@@ -49,6 +98,161 @@ class UtilsTests(SimpleTestCase):
 		}
 		self.assertFalse(detect_circular(tasks))
 
+	def test_diff_ranking_only_changed(self):
+		old = {'A': (50, 1), 'B': (40, 2)}
+		new = {'A': (50, 1), 'B': (60, 1), 'C': (10, 3)}
+		deltas = diff_ranking(old, new)
+		self.assertEqual([d['task'] for d in deltas], ['B', 'C'])
+		self.assertEqual(deltas[0], {'task': 'B', 'score': 60, 'rank': 1})
+
+	def test_broker_fan_out(self):
+		broker = InProcessBroker()
+		q1, q2 = broker.subscribe(), broker.subscribe()
+		broker.unsubscribe(q2)
+		broker.publish({'type': 'ranking', 'deltas': []})
+		self.assertEqual(q1.qsize(), 1)
+		self.assertEqual(q2.qsize(), 0)
+
+
+class WriteQueueThreadingTests(SimpleTestCase):
+	class RecordingQueue(TaskWriteQueue):
+		"""Records each flushed group instead of writing; rows titled 'bad' fail."""
+		def __init__(self, gate=None, delay=0):
+			super().__init__()
+			self.groups = []
+			self.gate = gate
+			self.delay = delay
+
+		def _flush(self, items):
+			if self.gate is not None:
+				self.gate.wait(5)
+			time.sleep(self.delay)
+			if any(item['title'] == 'bad' for item in items):
+				raise ValueError('bad row')
+			self.groups.append([item['title'] for item in items])
+
+	def run_threads(self, targets):
+		threads = [threading.Thread(target=t) for t in targets]
+		for t in threads:
+			t.start()
+		return threads
+
+	def test_concurrent_submits_are_grouped(self):
+		writes = self.RecordingQueue(delay=0.002)
+		errors = []
+
+		def worker(n):
+			for r in range(30):
+				try:
+					writes.submit([{'title': f'{n}-{r}'}])
+				except Exception as exc:
+					errors.append(exc)
+
+		for t in self.run_threads([lambda n=n: worker(n) for n in range(8)]):
+			t.join(10)
+		flushed = [title for group in writes.groups for title in group]
+		self.assertEqual(errors, [])
+		self.assertEqual(sorted(flushed), sorted(f'{n}-{r}' for n in range(8) for r in range(30)))
+		# writers queued behind a flush share the next one
+		self.assertLess(len(writes.groups), 240)
+		self.assertFalse(writes._writing)
+		self.assertEqual(writes._pending, [])
+
+	def test_failing_batch_does_not_fail_its_group(self):
+		gate = threading.Event()
+		writes = self.RecordingQueue(gate)
+		results = {}
+
+		def submit(title):
+			try:
+				writes.submit([{'title': title}])
+				results[title] = None
+			except ValueError as exc:
+				results[title] = exc
+
+		# the leader blocks in _flush until the others are queued behind it,
+		# so 'ok1', 'bad' and 'ok2' are flushed as one group
+		threads = self.run_threads([lambda: submit('first')])
+		while not writes._writing:
+			time.sleep(0.001)
+		threads += self.run_threads([lambda t=t: submit(t) for t in ('ok1', 'bad', 'ok2')])
+		while len(writes._pending) < 3:
+			time.sleep(0.001)
+		gate.set()
+		for t in threads:
+			t.join(10)
+
+		self.assertIsInstance(results['bad'], ValueError)
+		self.assertEqual({k: v for k, v in results.items() if k != 'bad'}, {'first': None, 'ok1': None, 'ok2': None})
+		self.assertEqual(sorted(writes.groups), [['first'], ['ok1'], ['ok2']])
+
+
+class SnapshotTests(SimpleTestCase):
+	def setUp(self):
+		today = date.today()
+		self.tasks = [
+			{'title': f'S{i}', 'due_date': today + timedelta(days=i) if i % 3 else None,
+			 'estimated_hours': float(i + 1), 'importance': 10 - i,
+			 'dependencies': ['S0', 'external'] if i % 2 else []}
+			for i in range(8)
+		]
+		fd, self.path = tempfile.mkstemp(suffix='.snap')
+		os.close(fd)
+		self.addCleanup(os.remove, self.path)
+
+	def ranked(self, strategy):
+		task_map = {t['title']: t for t in self.tasks}
+		scored = [(calculate_priority(dict(t), task_map, strategy=strategy)[0], t['title']) for t in self.tasks]
+		return [title for _, title in sorted(scored, key=lambda s: -s[0])]
+
+	def test_round_trip_matches_scoring(self):
+		write_snapshot(self.path, [dict(t) for t in self.tasks], strategy='smart')
+		snap = Snapshot(self.path)
+		for strategy in ('smart', 'fastest'):
+			total, rows = snap.select(TaskQuery(), strategy=strategy)
+			self.assertEqual(total, 8)
+			self.assertEqual([r['title'] for r in rows], self.ranked(strategy))
+		row = next(r for r in rows if r['title'] == 'S1')
+		self.assertEqual(row['dependencies'], ['S0', 'external'])
+		self.assertEqual(row['due_date'], (date.today() + timedelta(days=1)).isoformat())
+		self.assertIs(type(row['breakdown']['weights']), dict)
+		self.assertFalse(snap.cycles)
+
+	def test_reranking_is_cached_per_day(self):
+		write_snapshot(self.path, [dict(t) for t in self.tasks], strategy='smart')
+		snap = Snapshot(self.path)
+		today = date.today().toordinal()
+		fastest = get_strategy('fastest')
+		self.assertIs(snap._ranked(fastest, today), snap._ranked(fastest, today))
+		# a later day re-scores (urgency moves) and evicts the old day
+		later = snap._ranked(fastest, today + 1)
+		self.assertIsNot(later, snap._ranked(fastest, today))
+		self.assertEqual(len(snap._ranked_cache), 1)
+		# the stored urgency column serves the written curve on the as-of day
+		with mock.patch.object(get_strategy('smart'), 'urgency', side_effect=AssertionError):
+			snap.select(TaskQuery(), strategy='smart')
+
+	def test_bad_files_raise_snapshot_error(self):
+		# empty (half-copied) file: mmap itself would raise ValueError
+		with self.assertRaises(SnapshotError):
+			Snapshot(self.path)
+		with override_settings(TASK_SNAPSHOT_PATH=self.path), self.assertLogs('analyzer.snapshot', 'ERROR'):
+			self.assertIsNone(get_snapshot())
+
+	def test_long_strategy_name_rejected(self):
+		name = 'é' * 9  # 18 bytes; cutting at 16 would split a character
+		load_strategies({name: {'weights': {'u': 1, 'i': 1, 'e': 1, 'd': 1}}})
+		self.addCleanup(STRATEGIES.pop, name)
+		with self.assertRaises(SnapshotError):
+			write_snapshot(self.path, [dict(t) for t in self.tasks], strategy=name)
+
+	def test_select_filters_and_pages(self):
+		write_snapshot(self.path, [dict(t) for t in self.tasks])
+		snap = Snapshot(self.path)
+		total, rows = snap.select(TaskQuery(no_deps=True, offset=1, limit=2))
+		self.assertEqual(total, 4)
+		self.assertEqual([r['title'] for r in rows], [t for t in self.ranked('smart') if int(t[1:]) % 2 == 0][1:3])
+
 
 class ViewsIntegrationTests(APITestCase):
 	def test_analyze_and_suggest_endpoints(self):
@@ -81,3 +285,195 @@ class ViewsIntegrationTests(APITestCase):
 		res2 = self.client.get('/api/tasks/')
 		self.assertEqual(res2.status_code, 200)
 		self.assertTrue(any(t['title'] == 'P1' for t in res2.data))
+		# listed tasks carry the score/rank that stream deltas patch
+		ranking = compute_ranking([t.to_dict() for t in Task.objects.all()])
+		self.assertEqual({t['title']: (t['score'], t['rank']) for t in res2.data}, ranking)
+
+	def test_task_create_publishes_deltas(self):
+		tracker.ranking = None
+		self.client.post('/api/tasks/', data=[{"title": "S1", "estimated_hours": 5, "importance": 3}], format='json')
+		# nobody listening: no cached ranking is kept
+		self.assertIsNone(tracker.ranking)
+		q = get_broker().subscribe()
+		tracker.prime()
+		try:
+			res = self.client.post('/api/tasks/', data=[{"title": "S2", "estimated_hours": 1, "importance": 9}], format='json')
+			self.assertEqual(res.status_code, 201)
+			message = q.get_nowait()
+			# S3 depends on S2 and lands last: only S3 is new, nothing else moves
+			self.client.post('/api/tasks/', data=[{"title": "S3", "estimated_hours": 9, "importance": 1, "dependencies": ["S2"]}], format='json')
+			self.assertEqual(q.get_nowait()['deltas'], [{'task': 'S3', 'score': tracker.ranking['S3'][0], 'rank': 3}])
+			# creating a missing dependency re-scores the task that names it
+			self.client.post('/api/tasks/', data=[{"title": "S4", "estimated_hours": 9, "importance": 1, "dependencies": ["S5"]}], format='json')
+			q.get_nowait()
+			before = tracker.ranking['S4'][0]
+			self.client.post('/api/tasks/', data=[{"title": "S5", "estimated_hours": 9, "importance": 1}], format='json')
+			changed = {d['task']: d for d in q.get_nowait()['deltas']}
+			self.assertEqual(changed['S4']['score'], before + 6)
+		finally:
+			get_broker().unsubscribe(q)
+		# S2 outranks S1, so both move; nothing unchanged is sent
+		self.assertEqual([(d['task'], d['rank']) for d in message['deltas']], [('S2', 1), ('S1', 2)])
+		# incremental ranks match a full recompute
+		self.assertEqual(tracker.ranking, compute_ranking([t.to_dict() for t in Task.objects.all()]))
+
+	def test_write_after_midnight_rolls_over_first(self):
+		tracker.ranking = None
+		Task.objects.create(title='R1', due_date=date.today() + timedelta(days=3), estimated_hours=5, importance=3)
+		q = get_broker().subscribe()
+		try:
+			tracker.prime()
+			# as if ranked yesterday, when R1's urgency was lower
+			tracker.day = date.today() - timedelta(days=1)
+			tracker.ranking['R1'] = (tracker.ranking['R1'][0] - 1, 1)
+			self.client.post('/api/tasks/', data=[{"title": "R2", "estimated_hours": 9, "importance": 1}], format='json')
+			deltas = q.get_nowait()['deltas']
+		finally:
+			get_broker().unsubscribe(q)
+		self.assertEqual(tracker.day, date.today())
+		self.assertIn('R1', [d['task'] for d in deltas])
+		self.assertEqual(tracker.ranking, compute_ranking([t.to_dict() for t in Task.objects.all()]))
+
+	@override_settings(PRIORITY_STREAM_MAX_CLIENTS=1)
+	def test_stream_capacity_and_release(self):
+		with mock.patch.object(PriorityStream, '_slots', None):
+			first = self.client.get('/api/tasks/stream/')
+			self.assertEqual(first['Content-Type'], 'text/event-stream')
+			self.assertEqual(self.client.get('/api/tasks/stream/').status_code, 503)
+			# closing the (never iterated) response frees the slot
+			first.close()
+			second = self.client.get('/api/tasks/stream/')
+			self.assertEqual(second.status_code, 200)
+			second.close()
+
+	def test_write_queue_upserts_last_write_wins(self):
+		writes = TaskWriteQueue()
+		writes.submit([{'title': 'W1', 'importance': 2}, {'title': 'W1', 'importance': 7}])
+		writes.submit([{'title': 'W2', 'estimated_hours': 3}])
+		self.assertEqual(Task.objects.get(title='W1').importance, 7)
+		self.assertEqual(Task.objects.count(), 2)
+
+	def test_analyze_filters_and_pages(self):
+		today = date.today()
+		tasks = [
+			{"title": f"Q{i}", "due_date": (today + timedelta(days=i)).isoformat(), "estimated_hours": i + 1,
+			 "importance": 10 - i, "dependencies": ["Q0"] if i % 2 else []}
+			for i in range(6)
+		]
+		full = self.client.post('/api/tasks/analyze/', data=tasks, format='json')
+		titles = [t['title'] for t in full.data]
+
+		res = self.client.post('/api/tasks/analyze/?offset=1&limit=2', data=tasks, format='json')
+		self.assertEqual([t['title'] for t in res.data], titles[1:3])
+		self.assertEqual(res['X-Total-Count'], '6')
+
+		week = (today + timedelta(days=3)).isoformat()
+		res = self.client.post(f'/api/tasks/analyze/?no_deps=1&due_before={week}', data=tasks, format='json')
+		self.assertEqual(sorted(t['title'] for t in res.data), ['Q0', 'Q2'])
+
+		res = self.client.post('/api/tasks/analyze/?priority=Urgent', data=tasks, format='json')
+		self.assertEqual(res.status_code, 400)
+
+		res = self.client.get('/api/tasks/suggest/?min_score=0&limit=5')
+		self.assertEqual(len(res.data['suggestions']), 5)
+		self.assertEqual(res.data['total'], 6)
+
+	def test_analysis_job_lifecycle(self):
+		tasks = [
+			{"title": f"J{i}", "estimated_hours": i + 1, "importance": 5, "dependencies": []}
+			for i in range(5)
+		]
+		res = self.client.post('/api/tasks/jobs/?strategy=fastest', data=tasks, format='json')
+		self.assertEqual(res.status_code, 202)
+		job_id = res.data['id']
+
+		# identical payload -> same job
+		again = self.client.post('/api/tasks/jobs/?strategy=fastest', data=tasks, format='json')
+		self.assertEqual((again.status_code, again.data['id']), (200, job_id))
+
+		self.assertEqual(self.client.get(f'/api/tasks/jobs/{job_id}/results/').status_code, 409)
+		self.assertEqual(process_next().id, job_id)
+		self.assertIsNone(process_next())
+
+		status = self.client.get(f'/api/tasks/jobs/{job_id}/')
+		self.assertEqual((status.data['status'], status.data['progress']), ('done', 5))
+		page = self.client.get(f'/api/tasks/jobs/{job_id}/results/?offset=1&limit=2')
+		self.assertEqual([t['title'] for t in page.data['results']], ['J1', 'J2'])
+
+	def test_analysis_job_reports_cycles(self):
+		tasks = [{"title": "C1", "dependencies": ["C2"]}, {"title": "C2", "dependencies": ["C1"]}]
+		job_id = self.client.post('/api/tasks/jobs/', data=tasks, format='json').data['id']
+		process_next()
+		status = self.client.get(f'/api/tasks/jobs/{job_id}/')
+		self.assertEqual(status.data['status'], 'failed')
+		self.assertIn('Circular', status.data['error']['error'])
+
+	def test_analysis_job_stores_only_failing_rows(self):
+		tasks = [{"title": f"V{i}"} for i in range(50)] + [{"title": "V50", "importance": 11}]
+		job_id = self.client.post('/api/tasks/jobs/', data=tasks, format='json').data['id']
+		process_next()
+		status = self.client.get(f'/api/tasks/jobs/{job_id}/')
+		self.assertEqual(status.data['status'], 'failed')
+		self.assertEqual(list(status.data['error']), ['50'])
+		self.assertIn('importance', status.data['error']['50'])
+
+		# resubmitting a failed job queues it again instead of returning the failure
+		again = self.client.post('/api/tasks/jobs/', data=tasks, format='json')
+		self.assertEqual((again.data['id'], again.data['status'], again.data['error']), (job_id, 'queued', None))
+
+	def test_worker_survives_queue_errors(self):
+		calls = []
+
+		def flaky():
+			calls.append(1)
+			if len(calls) == 1:
+				raise OperationalError('database is locked')
+			pool._stop.set()
+
+		pool = WorkerPool(workers=1, poll_interval=0.01)
+		with mock.patch('analyzer.jobs.process_next', side_effect=flaky), \
+				mock.patch('analyzer.jobs.connection'), self.assertLogs('analyzer.jobs', 'ERROR'):
+			pool.start()
+			pool._threads[0].join(timeout=5)
+		self.assertEqual(len(calls), 2)
+
+	def test_worker_pool_requeues_stale_jobs(self):
+		def stale(title):
+			job = AnalysisJob.objects.create(payload_hash=title, payload=[], status=AnalysisJob.RUNNING)
+			AnalysisJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=1))
+			return job
+
+		first = stale('a')
+		pool = WorkerPool(workers=1)
+		with self.assertLogs('analyzer.jobs', 'WARNING'):
+			pool._requeue_stale()
+		first.refresh_from_db()
+		self.assertEqual(first.status, AnalysisJob.QUEUED)
+		# rate-limited: the next poll doesn't scan again
+		second = stale('b')
+		pool._requeue_stale()
+		second.refresh_from_db()
+		self.assertEqual(second.status, AnalysisJob.RUNNING)
+
+	def test_job_hash_includes_date(self):
+		tasks = [{"title": "D1"}]
+		self.assertNotEqual(payload_hash(tasks, 'smart', None, date(2026, 1, 1)),
+							payload_hash(tasks, 'smart', None, date(2026, 1, 2)))
+
+	def test_suggest_and_list_from_snapshot(self):
+		self.client.post('/api/tasks/', data=[
+			{"title": "N1", "estimated_hours": 8, "importance": 2},
+			{"title": "N2", "estimated_hours": 1, "importance": 9},
+		], format='json')
+		fd, path = tempfile.mkstemp(suffix='.snap')
+		os.close(fd)
+		self.addCleanup(os.remove, path)
+		tasks = [t.to_dict() | {'due_date': t.due_date} for t in Task.objects.all()]
+		write_snapshot(path, tasks)
+
+		with override_settings(TASK_SNAPSHOT_PATH=path), mock.patch('analyzer.views.LAST_ANALYZED', []):
+			res = self.client.get('/api/tasks/suggest/')
+			self.assertEqual([s['title'] for s in res.data['suggestions']], ['N2', 'N1'])
+			res = self.client.get('/api/tasks/?source=snapshot&limit=1&offset=1')
+			self.assertEqual([t['title'] for t in res.data], ['N1'])
+			self.assertEqual(res['X-Total-Count'], '2')
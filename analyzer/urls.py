@@ -1,9 +1,14 @@
 from django.urls import path
 from .views import AnalyzeTasks, SuggestTasks
-from .views import TaskListCreate
+from .views import TaskListCreate, PriorityStream
+from .views import AnalysisJobCreate, AnalysisJobDetail, AnalysisJobResults
 
 urlpatterns = [
     path('analyze/', AnalyzeTasks.as_view()),
     path('suggest/', SuggestTasks.as_view()),
+    path('stream/', PriorityStream.as_view()),
+    path('jobs/', AnalysisJobCreate.as_view()),
+    path('jobs/<int:job_id>/', AnalysisJobDetail.as_view()),
+    path('jobs/<int:job_id>/results/', AnalysisJobResults.as_view()),
     path('', TaskListCreate.as_view()),
 ]
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from .strategies import Strategy, get_strategy
+
 
 """Priority scoring utilities.
 
@@ -29,9 +31,22 @@ def calculate_priority(task, task_map, strategy='smart', weights_override=None):
     """
     """
     Calculate a priority score and breakdown for a task.
-    strategy: 'smart' | 'fastest' | 'impact' | 'deadline'
+    strategy: 'smart' | 'fastest' | 'impact' | 'deadline' | any name
+    registered in analyzer.strategies
     Returns (score:int, breakdown:dict)
     """
+    score, factors = score_task(task, task_map, strategy, weights_override)
+    return score, build_breakdown(factors)
+
+
+def score_task(task, task_map, strategy='smart', weights_override=None):
+    """
+    Score a task without building the breakdown dict.
+    strategy may also be a compiled Strategy (from get_strategy), so loops
+    over many tasks resolve the strategy and weights_override once.
+    Returns (score:int, factors) where factors can be passed to
+    build_breakdown() later, e.g. only for the tasks actually returned.
+    """
     notes = []
 
     # --- Normalize due_date if it's a string ---
@@ -47,8 +62,13 @@ def calculate_priority(task, task_map, strategy='smart', weights_override=None):
 
     # --- 1. Urgency ---
     # Rationale: tasks with less time remaining (or past-due) should get
-    # a higher urgency_raw so they bubble up. We give a strong boost for
-    # past-due and a medium boost for due-today.
+    # a higher urgency_raw so they bubble up. The strategy's urgency curve
+    # maps days_left to urgency_raw (strong boost for past-due, medium for
+    # due-today by default).
+    if isinstance(strategy, Strategy):
+        compiled = strategy
+    else:
+        compiled = get_strategy(strategy, weights_override)
     urgency_raw = 0
     if due_date:
         today = datetime.today().date()
@@ -57,18 +77,9 @@ def calculate_priority(task, task_map, strategy='smart', weights_override=None):
         except Exception:
             days_left = None
 
-        if days_left is None:
-            urgency_raw = 0
-        else:
-            if days_left < 0:
-                urgency_raw = 30
-                notes.append("Past due date")
-            elif days_left == 0:
-                urgency_raw = 25
-                notes.append("Due today")
-            else:
-                urgency_raw = max(0, 20 - days_left)
-                notes.append(f"Urgency days_left={days_left}")
+        if days_left is not None:
+            urgency_raw = compiled.urgency(days_left)
+            notes.append(urgency_note(days_left))
 
     # --- 2. Importance ---
     # Rationale: Importance reflects long-term impact. We scale it so
@@ -102,33 +113,25 @@ def calculate_priority(task, task_map, strategy='smart', weights_override=None):
     # Strategy explanation
     # Different users or situations prefer different trade-offs.
     # The 'smart' strategy balances urgency, importance, effort and deps.
-    # Other strategies shift those weights to emphasize one factor.
-    weights = {
-        'smart':      {'u': 2, 'i': 3, 'e': 2, 'd': 2},
-        'fastest':    {'u': 1, 'i': 1, 'e': 3, 'd': 1},
-        'impact':     {'u': 1, 'i': 4, 'e': 1, 'd': 2},
-        'deadline':   {'u': 4, 'i': 1, 'e': 1, 'd': 2},
-    }
+    # Other strategies shift those weights to emphasize one factor; they are
+    # precompiled in analyzer.strategies (weights_override is compiled once
+    # and cached).
+    score = compiled.score(urgency_raw, importance_raw, effort_raw, dependency_raw)
 
-    # allow caller to override weights (partial overrides allowed)
-    base = weights.get(strategy, weights['smart'])
-    if isinstance(weights_override, dict):
-        w = base.copy()
-        for k, v in weights_override.items():
-            if k in w and isinstance(v, (int, float)):
-                w[k] = v
-    else:
-        w = base
+    return score, (urgency_raw, importance_raw, effort_raw, dependency_raw, compiled.weights, notes)
 
-    score = int(
-        urgency_raw * w['u']
-        + importance_raw * w['i']
-        + effort_raw * w['e']
-        + dependency_raw * w['d']
-    )
 
-    # clamp score to reasonable range
-    score = max(0, min(100, score))
+def urgency_note(days_left):
+    if days_left < 0:
+        return "Past due date"
+    if days_left == 0:
+        return "Due today"
+    return f"Urgency days_left={days_left}"
+
+
+def build_breakdown(factors):
+    """Assemble the breakdown dict (with explanation) from score_task factors."""
+    urgency_raw, importance_raw, effort_raw, dependency_raw, w, notes = factors
 
     # Human readable explanation
     # We also assemble a concise explanation string so the frontend can show
@@ -148,37 +151,65 @@ def calculate_priority(task, task_map, strategy='smart', weights_override=None):
         'importance_raw': importance_raw,
         'effort_raw': effort_raw,
         'dependency_raw': dependency_raw,
-        'weights': w,
+        # copied here, only for built breakdowns: w is the registry's
+        # read-only mapping and the breakdown is handed to callers
+        'weights': dict(w),
         'notes': notes,
         'explanation': explanation_str,
     }
 
-    return score, breakdown
+    return breakdown
 
 
-def detect_circular(tasks):
-    visited = set()
-    stack = set()
+def priority_label(score):
+    """Human priority label shown by the API and frontend."""
+    if score >= 45:
+        return 'High'
+    if score >= 25:
+        return 'Medium'
+    return 'Low'
 
-    def dfs(task_id):
-        if task_id in stack:
-            return True
 
-        if task_id in visited:
-            return False
+def check_tasks(tasks):
+    """
+    Reject task sets the analyzer won't score. Returns an error message or None.
+    - due dates in the past
+    - circular dependencies
+    """
+    today = datetime.today().date()
+    for t in tasks:
+        if t.get('due_date') and t['due_date'] < today:
+            return f"Task '{t['title']}' has a due date in the past. Please choose today or a future date."
 
-        visited.add(task_id)
-        stack.add(task_id)
+    if detect_circular({t["title"]: t for t in tasks}):
+        return "Circular dependencies detected. Please fix task dependencies to avoid cycles."
+    return None
 
-        for dep in tasks.get(task_id, {}).get("dependencies", []):
-            if dfs(dep):
-                return True
 
-        stack.remove(task_id)
-        return False
+def detect_circular(tasks):
+    # Iterative DFS (explicit stack) so long dependency chains in large task
+    # sets don't hit Python's recursion limit.
+    visited = set()
 
-    for task_id in tasks:
-        if dfs(task_id):
-            return True
+    for root in tasks:
+        if root in visited:
+            continue
+        visited.add(root)
+        on_path = {root}
+        stack = [(root, iter(tasks.get(root, {}).get("dependencies", []) or []))]
+
+        while stack:
+            task_id, deps = stack[-1]
+            for dep in deps:
+                if dep in on_path:
+                    return True
+                if dep not in visited:
+                    visited.add(dep)
+                    on_path.add(dep)
+                    stack.append((dep, iter(tasks.get(dep, {}).get("dependencies", []) or [])))
+                    break
+            else:
+                stack.pop()
+                on_path.discard(task_id)
 
     return False
@@ -2,79 +2,99 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import TaskSerializer
-from .utils import calculate_priority, detect_circular
-from datetime import datetime
-from .models import Task
+from .utils import build_breakdown, check_tasks, detect_circular, priority_label, score_task
+from .strategies import get_strategy
+from .query import TaskQuery
+from .models import AnalysisJob, Task
 from rest_framework import status
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from .events import get_broker, tracker
+from .db import task_writes
+from .jobs import submit_job
+from .snapshot import get_snapshot
+import json
+import queue
+import threading
+import time
 
 LAST_ANALYZED = []
 
 
+def parse_analyze_payload(request):
+    """Return (tasks_input, strategy, weights_override) for analyze-style requests."""
+    # Accept either:
+    # - a JSON array of tasks
+    # - or an object {"tasks": [...], "strategy": "...", "weights": {...}}
+    payload = request.data
+    if isinstance(payload, dict) and 'tasks' in payload:
+        tasks_input = payload.get('tasks')
+        strategy = payload.get('strategy', request.query_params.get('strategy', 'smart'))
+        weights_override = payload.get('weights')
+    else:
+        tasks_input = payload
+        strategy = request.query_params.get('strategy', 'smart')
+        weights_override = None
+    return tasks_input, strategy, weights_override
+
+
 class AnalyzeTasks(APIView):
     def post(self, request):
-        # Accept either:
-        # - a JSON array of tasks
-        # - or an object {"tasks": [...], "strategy": "...", "weights": {...}}
-        payload = request.data
-        if isinstance(payload, dict) and 'tasks' in payload:
-            tasks_input = payload.get('tasks')
-            strategy = payload.get('strategy', request.query_params.get('strategy', 'smart'))
-            weights_override = payload.get('weights')
-        else:
-            tasks_input = payload
-            strategy = request.query_params.get('strategy', 'smart')
-            weights_override = None
+        tasks_input, strategy, weights_override = parse_analyze_payload(request)
 
         serializer = TaskSerializer(data=tasks_input, many=True)
         if not serializer.is_valid():
             return Response(serializer.errors, status=400)
 
+        try:
+            query = TaskQuery.from_params(request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+
         tasks = serializer.validated_data
         task_map = {t["title"]: t for t in tasks}
 
-        # Edge case: Prevent past-due dates on creation
-        today = datetime.today().date()
-        for t in tasks:
-            if t.get('due_date') and t['due_date'] < today:
-                return Response({"error": f"Task '{t['title']}' has a due date in the past. Please choose today or a future date."}, status=400)
-
-        # Circular dependency check
-        maps_for_check = {t["title"]: t for t in tasks}
-        if detect_circular(maps_for_check):
-            return Response({"error": "Circular dependencies detected. Please fix task dependencies to avoid cycles."}, status=400)
+        # Edge cases: past-due dates on creation, circular dependencies
+        error = check_tasks(tasks)
+        if error:
+            return Response({"error": error}, status=400)
 
-        # Scoring
+        # Scoring: filters and paging are applied before breakdowns are built
+        compiled = get_strategy(strategy, weights_override)
+        total, page = query.select(tasks, lambda t: score_task(t, task_map, strategy=compiled))
         scored_tasks = []
-        for task in tasks:
-            score, breakdown = calculate_priority(task, task_map, strategy=strategy, weights_override=weights_override)
+        for score, factors, task in page:
+            breakdown = build_breakdown(factors)
             task["score"] = score
             task["breakdown"] = breakdown
             task["explanation"] = breakdown.get('explanation', breakdown.get('notes', []))
             # human priority label
-            if score >= 45:
-                task["priority"] = 'High'
-            elif score >= 25:
-                task["priority"] = 'Medium'
-            else:
-                task["priority"] = 'Low'
-
+            task["priority"] = priority_label(score)
             scored_tasks.append(task)
 
-        scored_tasks = sorted(scored_tasks, key=lambda x: x["score"], reverse=True)
-
-        # save for suggestions
+        # save for suggestions (the whole set, not just this page)
         global LAST_ANALYZED
-        LAST_ANALYZED = scored_tasks
+        LAST_ANALYZED = tasks
 
-        return Response(scored_tasks)
+        return Response(scored_tasks, headers={'X-Total-Count': str(total)})
 
 
 class SuggestTasks(APIView):
     def get(self, request):
         strategy = request.query_params.get('strategy', 'smart')
+        try:
+            query = TaskQuery.from_params(request.query_params, default_limit=3)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
 
         if not LAST_ANALYZED:
-            return Response({"message": "No analyzed tasks available. POST to /api/tasks/analyze/ first."}, status=400)
+            # fresh worker: serve from the mapped snapshot instead of re-scoring
+            snapshot = get_snapshot()
+            if snapshot is None:
+                return Response({"message": "No analyzed tasks available. POST to /api/tasks/analyze/ first."}, status=400)
+            total, suggestions = snapshot.select(query, strategy=strategy)
+            return Response({'suggestions': suggestions, 'cycles': snapshot.cycles, 'total': total})
 
         # Re-score with requested strategy (so frontend can switch strategies)
         task_map = {t['title']: t for t in LAST_ANALYZED}
@@ -82,38 +102,99 @@ class SuggestTasks(APIView):
         # detect cycles
         cycles = detect_circular({t['title']: t for t in LAST_ANALYZED})
 
-        recomputed = []
-        for t in LAST_ANALYZED:
-            score, breakdown = calculate_priority(t, task_map, strategy=strategy)
-            priority = 'Low'
-            if score >= 45:
-                priority = 'High'
-            elif score >= 25:
-                priority = 'Medium'
-
-            recomputed.append({
+        compiled = get_strategy(strategy)
+        total, page = query.select(LAST_ANALYZED, lambda t: score_task(t, task_map, strategy=compiled))
+        suggestions = []
+        for score, factors, t in page:
+            breakdown = build_breakdown(factors)
+            suggestions.append({
                 'title': t['title'],
                 'score': score,
-                'priority': priority,
+                'priority': priority_label(score),
                 'explanation': breakdown.get('notes', []),
                 'breakdown': breakdown,
             })
 
-        recomputed = sorted(recomputed, key=lambda x: x['score'], reverse=True)
-        top3 = recomputed[:3]
+        return Response({'suggestions': suggestions, 'cycles': cycles, 'total': total})
+
+
+class AnalysisJobCreate(APIView):
+    """Queue a large analysis to run in the background.
+
+    POST /api/tasks/jobs/ -> same body as /analyze/; 202 with the new job, or
+                             200 with the existing job for an identical payload
+    """
+    def post(self, request):
+        tasks_input, strategy, weights_override = parse_analyze_payload(request)
+        if not isinstance(tasks_input, list):
+            return Response({"error": "Expected a list of tasks"}, status=400)
+
+        job, created = submit_job(tasks_input, strategy=strategy, weights=weights_override)
+        return Response(job.to_dict(), status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+
+class AnalysisJobDetail(APIView):
+    """GET /api/tasks/jobs/<id>/ -> status, phase and progress of a job."""
+    def get(self, request, job_id):
+        job = AnalysisJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=404)
+        return Response(job.to_dict())
+
+
+class AnalysisJobResults(APIView):
+    """GET /api/tasks/jobs/<id>/results/?offset=0&limit=100 -> page of ranked tasks."""
+    max_limit = 1000
+
+    def get(self, request, job_id):
+        job = AnalysisJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": "Job not found"}, status=404)
+        if job.status != AnalysisJob.DONE:
+            return Response(job.to_dict(), status=status.HTTP_409_CONFLICT)
+
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            limit = min(self.max_limit, max(0, int(request.query_params.get('limit', 100))))
+        except ValueError:
+            return Response({"error": "'offset' and 'limit' must be integers"}, status=400)
 
-        return Response({'suggestions': top3, 'cycles': cycles})
+        rows = job.results.filter(rank__gt=offset, rank__lte=offset + limit).order_by('rank')
+        return Response({
+            'total': job.total,
+            'offset': offset,
+            'limit': limit,
+            'results': [r.data for r in rows],
+        })
 
 
 class TaskListCreate(APIView):
     """List persisted tasks or create new tasks in DB.
 
-    GET /api/tasks/        -> list persisted tasks
+    GET /api/tasks/        -> list persisted tasks with their score and rank
+    GET /api/tasks/?source=snapshot&strategy=..&limit=..
+                           -> ranked tasks from the task snapshot (accepts the
+                              /analyze/ filter and paging parameters)
     POST /api/tasks/       -> create tasks (accepts single task object or array)
     """
     def get(self, request):
-        tasks = Task.objects.all().order_by('-created_at')
-        return Response([t.to_dict() for t in tasks])
+        if request.query_params.get('source') == 'snapshot':
+            snapshot = get_snapshot()
+            if snapshot is None:
+                return Response({"error": "No task snapshot available. Run manage.py export_snapshot first."}, status=404)
+            try:
+                query = TaskQuery.from_params(request.query_params)
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=400)
+            total, rows = snapshot.select(query, strategy=request.query_params.get('strategy', 'smart'))
+            return Response(rows, headers={'X-Total-Count': str(total)})
+
+        tasks = [t.to_dict() for t in Task.objects.all().order_by('-created_at')]
+        # the same score/rank as /stream/ deltas, so clients can patch the list
+        ranking = tracker.ranks(tasks)
+        for t in tasks:
+            t['score'], t['rank'] = ranking.get(t['title'], (None, None))
+        return Response(tasks)
 
     def post(self, request):
         data = request.data
@@ -123,17 +204,96 @@ class TaskListCreate(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=400)
 
-        created = []
-        for obj in serializer.validated_data:
-            task_obj, _ = Task.objects.update_or_create(
+        # concurrent requests are grouped into one transaction (see analyzer.db)
+        task_writes.submit(serializer.validated_data)
+        created = [
+            Task(
                 title=obj.get('title'),
-                defaults={
-                    'due_date': obj.get('due_date'),
-                    'estimated_hours': obj.get('estimated_hours'),
-                    'importance': obj.get('importance'),
-                    'dependencies': obj.get('dependencies') or [],
-                }
-            )
-            created.append(task_obj.to_dict())
+                due_date=obj.get('due_date'),
+                estimated_hours=obj.get('estimated_hours'),
+                importance=obj.get('importance'),
+                dependencies=obj.get('dependencies') or [],
+            ).to_dict()
+            for obj in serializer.validated_data
+        ]
+
+        # push score/rank changes to /stream/ subscribers
+        tracker.refresh([obj['title'] for obj in serializer.validated_data])
 
         return Response(created, status=status.HTTP_201_CREATED)
+
+
+class _ClosingStream:
+    """Streaming body whose cleanup runs when Django closes the response,
+    even if the generator never started (client gone before the first byte)."""
+
+    def __init__(self, iterator, cleanup):
+        self._iterator = iterator
+        self._cleanup = cleanup
+
+    def __iter__(self):
+        return self._iterator
+
+    def close(self):
+        self._iterator.close()
+        if self._cleanup is not None:
+            cleanup, self._cleanup = self._cleanup, None
+            cleanup()
+
+
+class PriorityStream(View):
+    """Server-sent events with ranking deltas for persisted tasks.
+
+    GET /api/tasks/stream/ -> text/event-stream of `ranking` events, each
+    carrying only the tasks whose score or rank changed. A plain Django view
+    so DRF content negotiation doesn't reject `Accept: text/event-stream`.
+
+    Each open stream holds a worker thread, so a process accepts at most
+    PRIORITY_STREAM_MAX_CLIENTS streams (503 beyond that) and closes each
+    one after PRIORITY_STREAM_MAX_SECONDS; EventSource reconnects on its own
+    after `retry:`. Events only reach streams in the process that handled
+    the write (see README).
+    """
+    heartbeat_seconds = 15
+    _slots = None
+    _slots_lock = threading.Lock()
+
+    @classmethod
+    def slots(cls):
+        with cls._slots_lock:
+            if cls._slots is None:
+                cls._slots = threading.BoundedSemaphore(settings.PRIORITY_STREAM_MAX_CLIENTS)
+            return cls._slots
+
+    def get(self, request):
+        slots = self.slots()
+        if not slots.acquire(blocking=False):
+            response = JsonResponse({"error": "Too many open streams; retry later."}, status=503)
+            response['Retry-After'] = '30'
+            return response
+
+        broker = get_broker()
+        q = broker.subscribe()
+        tracker.prime()
+        deadline = time.monotonic() + settings.PRIORITY_STREAM_MAX_SECONDS
+
+        def events():
+            yield "retry: 5000\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    message = q.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    # the daily rollover publishes onto q; pick it up next loop
+                    tracker.rollover_if_needed()
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message['deltas'])}\n\n"
+
+        def cleanup():
+            broker.unsubscribe(q)
+            slots.release()
+
+        response = StreamingHttpResponse(_ClosingStream(events(), cleanup), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,9 +82,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep connections (and their pragmas) across requests
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # take the write lock at BEGIN so busy_timeout applies instead of
+            # failing on a read->write lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Applied to every new SQLite connection by analyzer.db.configure_sqlite.
+# Set to {} to fall back to SQLite defaults.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,       # ms to wait for the write lock
+    'mmap_size': 268435456,     # 256 MB
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,6 +143,30 @@ STATIC_URL = 'static/'
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:8001',
 ]
+# let the frontend read the match count of paged /analyze/ responses
+CORS_EXPOSE_HEADERS = ['X-Total-Count']
+
+# Pub/sub used for the /api/tasks/stream/ ranking events. Any class with
+# publish/subscribe/unsubscribe/has_subscribers can replace the in-process default.
+PRIORITY_EVENTS_BROKER = 'analyzer.events.InProcessBroker'
+
+# Every open stream holds a worker thread. Cap them per process so a few
+# browser tabs can't take all of the API's threads, and end each stream
+# after a while (clients reconnect automatically). The broker is
+# in-process, so streams have to be served by the process that handles the
+# writes; raise the cap together with its --threads (see README).
+PRIORITY_STREAM_MAX_CLIENTS = int(os.environ.get('PRIORITY_STREAM_MAX_CLIENTS', 1))
+PRIORITY_STREAM_MAX_SECONDS = int(os.environ.get('PRIORITY_STREAM_MAX_SECONDS', 300))
+
+# Extra/overridden scoring strategies, compiled once at startup by
+# analyzer.strategies.load_strategies. Urgency curves: 'linear', 'exponential'.
+SCORING_STRATEGIES = {
+    'deadline_decay': {'weights': {'u': 4, 'i': 1, 'e': 1, 'd': 2}, 'urgency': 'exponential'},
+}
+
+# Binary snapshot of an analyzed task set (manage.py export_snapshot). Workers
+# mmap it to serve /suggest/ and /api/tasks/?source=snapshot without re-scoring.
+TASK_SNAPSHOT_PATH = BASE_DIR / 'tasks.snap'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field